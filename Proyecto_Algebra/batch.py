@@ -0,0 +1,262 @@
+import argparse
+import concurrent.futures as cf
+import contextlib
+import csv
+import io
+import json
+import math
+import os
+import sys
+import zipfile
+from collections import deque
+
+import numpy as np
+import makarov as m
+'''
+Punto de entrada por linea de comandos (sin GUI) para analizar muchas cadenas de Markov.
+
+Las cadenas se leen de un archivo una por una (JSONL, CSV o .npz), se reparten en un
+grupo de procesos con un limite de trabajos en vuelo y los resultados se escriben
+apenas estan listos (JSONL o .npz). Asi la memoria no crece con el numero de cadenas.
+
+Formatos de entrada:
+-> JSONL: una cadena por linea {"id": "clima", "states": ["soleado", "lluvioso"], "matrix": [[0.7, 0.3], [0.5, 0.5]]}
+          ("id" y "states" son opcionales)
+-> CSV:   una cadena por fila: id seguido de los n*n valores de la matriz por filas
+-> .npz:  cada arreglo (n x n) es una cadena y su nombre es el id
+
+Las filas (o arreglos .npz) que no se pueden leer se reportan como error en la salida sin
+detener el resto del proceso.
+
+En la salida .npz cada cadena se guarda bajo su numero de entrada (desde 0), no bajo su id,
+asi dos cadenas con el mismo id (o con "/" en el id) no se pisan:
+    "0/id", "0/steady_state", "0/P^5", "1/id", "1/error", ...
+
+Ejemplo:
+    python batch.py cadenas.jsonl -o resultados.jsonl --steady --horizons 5 10 --simulate 1000
+'''
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item_id = str(line_no)
+            try:
+                data = json.loads(line)
+                if not isinstance(data, dict):
+                    raise ValueError("cada linea debe ser un objeto JSON")
+                item_id = str(data.get("id", line_no))
+                yield {"id": item_id, "states": data.get("states"), "matrix": data["matrix"]}
+            except (ValueError, KeyError) as e: #json.JSONDecodeError es un ValueError
+                yield {"id": item_id, "error": f"{type(e).__name__}: {e}"}
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                values = [float(v) for v in row[1:]]
+            except ValueError as e:
+                yield {"id": row[0], "error": f"ValueError: {e}"}
+                continue
+            n = math.isqrt(len(values))
+            if n * n != len(values):
+                yield {"id": row[0], "error": f"ValueError: {len(values)} valores no forman una matriz cuadrada"}
+                continue
+            yield {"id": row[0], "states": None, "matrix": np.array(values).reshape(n, n)}
+
+
+def read_npz(path):
+    #np.load con .npz carga cada arreglo solo cuando se accede a el
+    with np.load(path) as data:
+        for key in data.files:
+            try:
+                matrix = data[key]
+            except (ValueError, OSError, zipfile.BadZipFile) as e: #ej: arreglos de objetos (allow_pickle=False)
+                yield {"id": key, "error": f"{type(e).__name__}: {e}"}
+                continue
+            yield {"id": key, "states": None, "matrix": matrix}
+
+
+READERS = {".jsonl": read_jsonl, ".json": read_jsonl, ".csv": read_csv, ".npz": read_npz}
+
+
+def read_chains(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in READERS:
+        raise ValueError(f"Formato de entrada no soportado: {ext}")
+    return READERS[ext](path)
+
+
+def analyze(item, options):
+    """
+    Ejecuta los analisis pedidos sobre una cadena (corre dentro de un proceso del grupo)
+
+    Args:
+        item: Diccionario con 'id', 'states' y 'matrix'
+        options: Diccionario con 'steady', 'horizons', 'simulate', 'initial_state', 'seed', 'dtype' y 'refine'
+
+    Returns:
+        Diccionario con los resultados, o con 'error' si la cadena no es valida
+    """
+    result = {"id": item["id"], "index": item["index"]}
+    try:
+        matrix = item["matrix"]
+        n = len(matrix)
+        states = item["states"] or [str(i) for i in range(n)]
+
+        #MarkovChain imprime mensajes de validacion; no deben mezclarse con la salida
+        with contextlib.redirect_stdout(io.StringIO()):
+            #Cada cadena se analiza una sola vez: no vale la pena guardar Z^-1 ni P^n
+            chain = m.MarkovChain(states, matrix, dtype=options["dtype"], copy=False,
+                                  refine=options["refine"], cache=False)
+
+        result["states"] = list(states)
+        if options["steady"]:
+            result["steady_state"] = chain.find_steady_state()
+        for days in options["horizons"]:
+            result[f"P^{days}"] = chain.multi_day_probabilities(days)
+        if options["simulate"]:
+            if options["seed"] is not None:
+                np.random.seed((options["seed"] + item["index"]) % 2**32)
+            history = chain.simulate_steps(options["initial_state"], options["simulate"])
+            result["simulation_frequencies"] = np.bincount(history, minlength=n) / len(history)
+            result["simulation_final_state"] = int(history[-1])
+    except Exception as e:
+        result = {"id": item["id"], "index": item["index"], "error": f"{type(e).__name__}: {e}"}
+    return result
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.f = sys.stdout if path == "-" else open(path, "w", encoding="utf-8")
+
+    def write(self, result):
+        row = {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in result.items() if k != "index"}
+        self.f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+class NpzWriter:
+    """
+    Escribe un .npz compatible con np.load agregando un arreglo a la vez,
+    sin guardar los resultados anteriores en memoria. Los nombres usan el numero
+    de entrada ("3/steady_state") y el id va en su propio arreglo ("3/id")
+    """
+    def __init__(self, path):
+        self.zf = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+
+    def write(self, result):
+        for key, value in result.items():
+            if key == "index":
+                continue
+            with self.zf.open(f"{result['index']}/{key}.npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, np.asarray(value), allow_pickle=False)
+
+    def close(self):
+        self.zf.close()
+
+
+def open_writer(path):
+    if path != "-" and os.path.splitext(path)[1].lower() == ".npz":
+        return NpzWriter(path)
+    return JsonlWriter(path)
+
+
+def run(items, options, writer, workers=None, max_in_flight=None):
+    """
+    Reparte las cadenas en un grupo de procesos y escribe cada resultado al terminar
+
+    Como maximo hay max_in_flight cadenas enviadas sin resultado escrito, asi que la
+    memoria depende de ese limite y no del tamaño de la entrada. Los resultados se
+    escriben en el mismo orden que la entrada.
+
+    Returns:
+        Tupla (cadenas procesadas, cadenas con error)
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    done = failed = 0
+    pending = deque()
+
+    def flush_one():
+        nonlocal done, failed
+        result = pending.popleft().result()
+        writer.write(result)
+        done += 1
+        failed += "error" in result
+
+    with cf.ProcessPoolExecutor(max_workers=workers) as pool:
+        for index, item in enumerate(items):
+            item["index"] = index
+            if "error" in item:
+                #Error de lectura: se reporta en su lugar sin enviarlo al grupo
+                future = cf.Future()
+                future.set_result(item)
+            else:
+                future = pool.submit(analyze, item, options)
+            pending.append(future)
+            if len(pending) >= max_in_flight:
+                flush_one()
+        while pending:
+            flush_one()
+
+    return done, failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analiza muchas cadenas de Markov desde un archivo (sin GUI)")
+    parser.add_argument("input", help="Archivo de entrada (.jsonl, .csv o .npz)")
+    parser.add_argument("-o", "--output", default="-", help="Archivo de salida (.jsonl o .npz); '-' para stdout")
+    parser.add_argument("--steady", action="store_true", help="Calcular el estado estacionario")
+    parser.add_argument("--horizons", type=int, nargs="+", default=[], metavar="DIAS", help="Calcular P^dias para cada valor")
+    parser.add_argument("--simulate", type=int, default=0, metavar="PASOS", help="Simular PASOS pasos y resumir frecuencias")
+    parser.add_argument("--initial-state", type=int, default=0, help="Estado inicial (indice) para la simulacion")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para simulaciones reproducibles")
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float64", help="Precision de la matriz (float32 usa la mitad de memoria)")
+    parser.add_argument("--refine", action="store_true", help="Con float32, refinar el estado estacionario hasta precision float64")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Numero de procesos (por defecto: CPUs)")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Maximo de cadenas en proceso a la vez (por defecto: 2 x procesos)")
+    args = parser.parse_args(argv)
+
+    if not (args.steady or args.horizons or args.simulate):
+        args.steady = True
+    if any(days <= 0 for days in args.horizons):
+        parser.error("Nro. de días debe ser positivo")
+    if args.simulate < 0:
+        parser.error("Nro. de pasos no puede ser negativo")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = {
+        "steady": args.steady,
+        "horizons": args.horizons,
+        "simulate": args.simulate,
+        "initial_state": args.initial_state,
+        "seed": args.seed,
+        "dtype": args.dtype,
+        "refine": args.refine,
+    }
+
+    writer = open_writer(args.output)
+    try:
+        done, failed = run(read_chains(args.input), options, writer, args.workers, args.max_in_flight)
+    finally:
+        writer.close()
+
+    print(f"👌 {done} cadenas procesadas ({failed} con error)", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,59 +22,320 @@ Esta matriz debe de cumplir que
 -> Todas sus componentes deben de ser positivas (R > 0)
 '''
 
+DTYPES = (np.float32, np.float64)
+BLOCK_BYTES = 16 * 2**20    #Memoria maxima de los temporales que se procesan por bloques de filas
+MAX_CACHED_POWERS = 2       #Cuantas potencias P^n se guardan a la vez
+WARM_START_ITER = 100       #Iteraciones maximas al recalcular el estado estacionario desde el anterior
+
 class MarkovChain:
-    def __init__(self, states, transition_matrix):
+    def __init__(self, states, transition_matrix, dtype=np.float64, copy=True, refine=False, cache=True):
         """
         Inicializa la cadena de Markov
         
         Args:
             states: Lista de nombres de estados ej: ['Soleado', 'Lluvioso']
             transition_matrix: Matriz de transición (cuadrada, filas suman 1 ya que es estocastico)
+            dtype: np.float32 o np.float64. En float32 la matriz ocupa la mitad de memoria
+            copy: Si es False y transition_matrix ya es un arreglo del dtype pedido (por ejemplo
+                un np.memmap) se usa directamente sin copiarlo. Ojo: la normalizacion y
+                update_rows modifican entonces el arreglo del usuario
+            refine: Si es True y dtype es float32, el estado estacionario se corrige con
+                refinamiento iterativo en float64 (precision mixta)
+            cache: Si es True se guardan Z^-1 (para que update_rows cueste O(n^2)) y hasta
+                MAX_CACHED_POWERS potencias P^n, cada una de n x n. Con False solo se guarda
+                el vector estacionario, para cadenas grandes donde la memoria es el limite
         """
+        dtype = np.dtype(dtype)
+        if dtype not in DTYPES:
+            raise ValueError("dtype debe ser float32 o float64")
+
         self.states = states
-        self.P = np.array(transition_matrix)  
+        if copy:
+            self.P = np.array(transition_matrix, dtype=dtype)
+        else:
+            self.P = np.asarray(transition_matrix, dtype=dtype)
+        self.refine = refine
+        self.cache = cache
         self.validate_matrix()
-    
+        self._clear_caches()
+
+    def _clear_caches(self):
+        #Caches que dependen de toda la matriz P
+        self._steady_state = None   #Vector estacionario ya calculado
+        self._Z_inv = None          #Inversa de Z = I - P + E (factorizacion para actualizar el estado estacionario)
+        self._powers = {}           #Ultimas potencias P^n calculadas {n: P^n} (hasta MAX_CACHED_POWERS)
+
+    def _row_blocks(self, itemsize=8):
+        #Rebanadas de filas cuyo temporal (filas x n x itemsize) no pasa de BLOCK_BYTES
+        n = self.P.shape[0]
+        step = max(1, BLOCK_BYTES // (itemsize * n))
+        for start in range(0, n, step):
+            yield slice(start, start + step)
+
+    def _times_P(self, pi):
+        #pi P en float64; si P es float32 se convierte por bloques de filas, sin copiar P entera
+        if self.P.dtype == np.float64:
+            return pi @ self.P
+        pi_P = np.zeros(self.P.shape[0])
+        for rows in self._row_blocks():
+            pi_P += pi[rows] @ self.P[rows].astype(np.float64)
+        return pi_P
+
     def validate_matrix(self):
         #Validar que es nxn
         if self.P.shape[0]!= self.P.shape[1]:  #Toma las filas de la matriz y sus columnas y las compara
             raise ValueError("La matriz debe de ser cuadrada") #genera mensaje de error si no se cumple
         
         
+        self.P = self._check_rows(self.P)
+        
+        print("👌 Matriz valida")
+
+    def _check_rows(self, rows):
+        """
+        Verifica que las filas sean estocasticas y positivas (usado por validate_matrix y update_rows)
+
+        Args:
+            rows: Arreglo (k x n) con las filas a verificar
+
+        Returns:
+            Las filas normalizadas (el mismo arreglo si se pudo normalizar en su lugar)
+        """
         #Verificar que sea estocastica
-        row_sums = np.sum(self.P, axis=1)
+        row_sums = np.sum(rows, axis=1)
         if not np.allclose(row_sums, 1.0, atol=1e-10): #Verifica si la suma de cada fila es 1
             print(f"Advertencia: Las filas no suman exactamente 1. Sumas: {row_sums}")
             print("Normalizando automáticamente...")
-            self.P = self.P / row_sums[:, np.newaxis] #De no ser normaliza cada fila automaticamente
+            if rows.flags.writeable:
+                rows /= row_sums[:, np.newaxis] #De no ser normaliza cada fila automaticamente (sin copiar la matriz)
+            else:
+                rows = rows / row_sums[:, np.newaxis] #Arreglo de solo lectura (ej: memmap en modo 'r'): hay que copiar
             
-        #Verificar que los elementos de la matriz sean positivos
-        if np.any(self.P < 0) or np.any(self.P > 1):
+        #Verificar que los elementos de la matriz sean positivos (min/max no crean matrices temporales)
+        if rows.min() < 0 or rows.max() > 1:
             raise ValueError("Debe ser una matriz de valores positivos")
-        
-        print("👌 Matriz valida")
-    
-    
+
+        return rows
+
+    def _validate_rows(self, rows, new_rows):
+        """
+        Valida solo las filas editadas
+
+        Args:
+            rows: Indices de las filas a reemplazar
+            new_rows: Arreglo (k x n) con las nuevas filas
+
+        Returns:
+            Las nuevas filas normalizadas
+        """
+        n = self.P.shape[0]
+        if new_rows.ndim != 2 or new_rows.shape != (len(rows), n):
+            raise ValueError(f"Cada fila nueva debe tener {n} elementos")
+        if len(set(rows)) != len(rows) or any(r < 0 or r >= n for r in rows):
+            raise ValueError("Indices de fila invalidos o repetidos")
+
+        return self._check_rows(new_rows)
+
+    def _is_reliable(self, Z_inv, steady_vector):
+        """
+        Decide si Z^-1 y el vector obtenido con ella son confiables
+
+        En cadenas reducibles Z es singular, pero por redondeo np.linalg.inv casi nunca
+        falla: devuelve una inversa enorme y un vector que no es estacionario. Se rechaza
+        si Z esta mal condicionada (||Z||_inf = n porque Z >= 0 y sus filas suman n)
+        o si el residuo ||pi P - pi|| es grande. Ambas pruebas cuestan O(n^2).
+        Sin Z_inv (solucion con np.linalg.solve) solo se revisa el residuo.
+        """
+        eps = np.finfo(self.P.dtype).eps
+        n = self.P.shape[0]
+        if Z_inv is not None:
+            norm_inv = max(np.max(np.sum(np.abs(Z_inv[rows]), axis=1)) for rows in self._row_blocks(Z_inv.itemsize))
+            cond = n * norm_inv
+            if not np.isfinite(cond) or cond * eps > 0.1:
+                return False
+        residual = np.max(np.abs(steady_vector.astype(self.P.dtype) @ self.P - steady_vector))
+        return residual <= np.sqrt(eps)
+
+    def update_rows(self, rows, new_rows):
+        """
+        Reemplaza algunas filas de P sin reconstruir la cadena
+
+        Solo se validan las filas editadas. Si ya existe la inversa de Z = I - P + E
+        (E = matriz de unos), el estado estacionario se actualiza con Sherman-Morrison:
+        cambiar la fila i en d equivale a Z' = Z - e_i d^T, una actualizacion de rango 1
+        que cuesta O(n^2) por fila en vez de O(n^3). Como pi Z = 1^T, el nuevo
+        estado estacionario son las sumas por columna de Z'^-1.
+
+        Sin Z^-1 (cache=False, o si la actualizacion no es confiable) se parte del
+        estado estacionario anterior y se itera pi <- (pi + pi P) / 2, a lo sumo
+        WARM_START_ITER veces de O(n^2). Si no converge, o si nunca se llamo a
+        find_steady_state, el siguiente find_steady_state resuelve desde cero en O(n^3).
+
+        Args:
+            rows: Indice o lista de indices de las filas a cambiar
+            new_rows: Fila nueva o lista de filas nuevas (mismo orden que rows)
+        """
+        if np.ndim(rows) == 0:
+            rows = [rows]
+            new_rows = [new_rows]
+        rows = [int(r) for r in rows]
+        new_rows = self._validate_rows(rows, np.array(new_rows, dtype=self.P.dtype))
+        if not self.P.flags.writeable:
+            self.P = self.P.copy() #Arreglo de solo lectura (ej: memmap en modo 'r')
+
+        #Las potencias P^n dependen de todas las filas: se descartan
+        self._powers = {}
+
+        Z_inv = self._Z_inv
+        for i, new_row in zip(rows, new_rows):
+            d = new_row - self.P[i]
+            self.P[i] = new_row
+            if Z_inv is None:
+                continue
+            #Sherman-Morrison: (Z - e_i d^T)^-1 = Z^-1 + (Z^-1 e_i)(d^T Z^-1) / (1 - d^T Z^-1 e_i)
+            u = Z_inv[:, i].copy()
+            v = d @ Z_inv
+            denom = 1.0 - v[i]
+            if abs(denom) < 1e-12:
+                #Z dejo de ser invertible (cadena reducible)
+                Z_inv = None
+                continue
+            v /= denom
+            #Se actualiza en su lugar por bloques de filas para no crear otra matriz n x n
+            for blk in self._row_blocks(Z_inv.itemsize):
+                Z_inv[blk] += np.outer(u[blk], v)
+
+        previous = self._steady_state
+        self._Z_inv = None
+        self._steady_state = None
+        if Z_inv is not None:
+            steady_vector = np.abs(np.sum(Z_inv, axis=0))
+            steady_vector = steady_vector / np.sum(steady_vector)
+            #Si la edicion dejo la cadena reducible (o casi) se descarta Z^-1
+            if self._is_reliable(Z_inv, steady_vector):
+                self._Z_inv = Z_inv
+                self._steady_state = self._refine_steady_state(steady_vector, Z_inv)
+                return
+        if previous is not None:
+            self._steady_state = self._warm_start(previous)
+
+    def _warm_start(self, steady_vector, max_iter=WARM_START_ITER):
+        """
+        Itera pi <- (pi + pi P) / 2 partiendo de un estado estacionario anterior
+
+        Se usa la cadena perezosa (P + I) / 2, que tiene el mismo estado estacionario
+        pero no es periodica, asi que la iteracion no oscila. Cada paso cuesta O(n^2)
+        y se acumula en float64 (con P en float32 acumular en float32 se estanca).
+        Se normaliza en cada paso y se para cuando pi deja de cambiar: con P en
+        float32 las filas no suman exactamente 1, asi que el residuo ||pi P - pi||
+        no baja de ~eps de float32 aunque pi ya haya convergido.
+
+        Returns:
+            El nuevo vector estacionario en float64, o None si no convergio en max_iter pasos
+        """
+        #Tolerancia relativa al mayor componente segun la precision de P. Con refine en
+        #float32 se busca la misma precision (~1e-12) que da el refinamiento
+        tol = max(100 * np.finfo(np.float64).eps, np.finfo(self.P.dtype).eps)
+        if self.refine and self.P.dtype == np.float32:
+            tol = 1e4 * np.finfo(np.float64).eps
+        pi = steady_vector.astype(np.float64)
+        pi /= np.sum(pi)
+        for _ in range(max_iter):
+            new_pi = (pi + self._times_P(pi)) / 2
+            new_pi /= np.sum(new_pi)
+            if np.max(np.abs(new_pi - pi)) <= tol * np.max(new_pi):
+                return new_pi
+            pi = new_pi
+        return None
+
+
     #Nuestro steady state sera el vector propio generado para nuestro lambda 1    
     def find_steady_state(self):
         """
-        Encuentra el estado estacionario usando vectores propios
+        Encuentra el estado estacionario (vector propio de P^T con valor propio 1)
+
+        El resultado queda guardado hasta que se edite la matriz con update_rows.
+        Memoria (matrices n x n del dtype de P, ademas de P):
+        -> cache=False y sin refinamiento: se resuelve Z^T pi = 1 y el pico es de
+           unas 3 (Z y las copias de trabajo de np.linalg.solve)
+        -> cache=True o refine con float32: hace falta Z^-1 y np.linalg.inv llega a
+           unas 5 (Z, la copia, la identidad, su buffer y Z^-1). Con cache=True Z^-1
+           se queda guardada despues
         
         Returns:
             Vector con probabilidades estacionarias para cada estado
         """
         
-        eigenvalues, eigenvectors = np.linalg.eig(self.P.T)
-        
-        #Encuentra el vector propio con valor propio 1
-        idx = np.argmin(np.abs(eigenvalues-1.0))
-        steady_vector= np.real(eigenvectors[:, idx])
-        
-        #Normaliza el vector
-        steady_vector  = np.abs(steady_vector) #toma valores absolutos
-        steady_vector = steady_vector / np.sum(steady_vector)    
-    
-        return steady_vector
+        if self._steady_state is not None:
+            return self._steady_state.copy()
+
+        #pi (I - P + E) = 1^T, con E la matriz de unos. Con cache guardamos Z^-1 para
+        #que update_rows pueda actualizar el resultado sin volver a factorizar
+        #Z se arma en el dtype de P y sin temporales extra: Z = -P + 1 y luego +1 en la diagonal
+        Z = np.negative(self.P)
+        Z += 1
+        Z.flat[::Z.shape[0] + 1] += 1
+        need_inverse = self.cache or (self.refine and self.P.dtype == np.float32)
+        Z_inv = None
+        try:
+            if need_inverse:
+                Z_inv = np.linalg.inv(Z)
+                steady_vector = np.sum(Z_inv, axis=0)
+            else:
+                steady_vector = np.linalg.solve(Z.T, np.ones(Z.shape[0], dtype=Z.dtype))
+            del Z
+            steady_vector = np.abs(steady_vector)
+            steady_vector = steady_vector / np.sum(steady_vector)
+            solved = self._is_reliable(Z_inv, steady_vector)
+        except np.linalg.LinAlgError:
+            solved = False
+        if not solved:
+            Z_inv = None
+        self._Z_inv = Z_inv if self.cache else None
+
+        if not solved:
+            #Cadena reducible: Z no es invertible, usamos los vectores propios
+            eigenvalues, eigenvectors = np.linalg.eig(self.P.T)
+
+            #Encuentra el vector propio con valor propio 1
+            idx = np.argmin(np.abs(eigenvalues-1.0))
+            steady_vector= np.real(eigenvectors[:, idx])
+
+            #Normaliza el vector
+            steady_vector  = np.abs(steady_vector) #toma valores absolutos
+            steady_vector = steady_vector / np.sum(steady_vector)
+
+        self._steady_state = self._refine_steady_state(steady_vector, Z_inv)
+        return self._steady_state.copy()
+
+    def _refine_steady_state(self, steady_vector, Z_inv, max_iter=10):
+        """
+        Refinamiento iterativo en precision mixta para cadenas en float32
+
+        El residuo r = 1^T - pi Z se calcula en float64 y la correccion d = r Z^-1 se
+        resuelve con la inversa en float32 ya calculada. Cada iteracion cuesta O(n^2)
+        y P se convierte a float64 por bloques de a lo sumo BLOCK_BYTES, sin copiar la
+        matriz entera.
+
+        La precision float64 se mide contra P tal como quedo redondeada a float32, no
+        contra la matriz original. Como esas filas no suman exactamente 1 en float64,
+        el punto fijo de pi Z = 1 no suma 1 exacto y se normaliza al final.
+
+        Returns:
+            El vector estacionario (en float64 si se refino)
+        """
+        if not self.refine or self.P.dtype != np.float32 or Z_inv is None:
+            return steady_vector
+
+        pi = steady_vector.astype(np.float64)
+        for _ in range(max_iter):
+            pi_P = self._times_P(pi)
+            #pi Z = pi - pi P + sum(pi)
+            r = 1.0 - (pi - pi_P + np.sum(pi))
+            if np.max(np.abs(r)) < 1e-14:
+                break
+            pi += (r.astype(np.float32) @ Z_inv).astype(np.float64)
+        return pi / np.sum(pi)
     
     def simulate_steps(self, initial_state, steps):
         """
@@ -103,12 +364,16 @@ class MarkovChain:
         
         return history
     
-    def multi_day_probabilities(self, days):
+    def multi_day_probabilities(self, days, out=None):
         """
         Calcula probabilidades para 'days' días en el futuro
         
         Args:
             days: Número de días en el futuro
+            out: Matriz (n x n) opcional donde se escribe el resultado (no puede ser P
+                ni compartir memoria con ella). Con out no se
+                guarda P^days en cache, para no ocupar otra matriz de memoria.
+                Sin out (y con cache=True) se guardan las ultimas MAX_CACHED_POWERS potencias
             
         Returns:
             Matriz P^days donde P^n[i,j] = P(estar en j después de n días | empezar en i)
@@ -116,8 +381,55 @@ class MarkovChain:
         Su diferencia es que en el simulate steps calculamos en base a datos alearorios del paso de los dias y
         En este caso calculamos los valores para cada dia usando el modelo y llegando a una predicion para una cantidad de dias que hayan pasado
         """
-        
-        return np.linalg.matrix_power(self.P, days)
+
+        if out is None:
+            if days in self._powers:
+                return self._powers[days].copy()
+            result = np.linalg.matrix_power(self.P, days)
+            if self.cache:
+                if len(self._powers) >= MAX_CACHED_POWERS:
+                    del self._powers[next(iter(self._powers))] #Se descarta la mas antigua
+                self._powers[days] = result.copy()
+            return result
+
+        if out.shape != self.P.shape:
+            raise ValueError(f"out debe tener forma {self.P.shape}")
+        if np.shares_memory(out, self.P):
+            raise ValueError("out no puede compartir memoria con la matriz de transicion")
+        if days in self._powers:
+            np.copyto(out, self._powers[days])
+            return out
+        if days < 0:
+            #Potencia negativa = inversa de P^|days|, igual que sin out
+            np.copyto(out, np.linalg.matrix_power(self.P, days))
+            return out
+        if days == 0:
+            out.fill(0)
+            out.flat[::out.shape[0] + 1] = 1
+            return out
+
+        #Exponenciacion binaria: out acumula el resultado, base guarda P^(2^k) y spare es
+        #la matriz auxiliar que se reutiliza: a lo sumo dos matrices extra y nunca se sobrescribe P
+        base = self.P
+        spare = None
+        started = False
+        while True:
+            if days & 1:
+                if not started:
+                    np.copyto(out, base)
+                    started = True
+                else:
+                    if spare is None:
+                        spare = np.empty_like(self.P)
+                    np.matmul(out, base, out=spare)
+                    np.copyto(out, spare)
+            days >>= 1
+            if not days:
+                return out
+            if spare is None:
+                spare = np.empty_like(self.P)
+            np.matmul(base, base, out=spare)
+            base, spare = spare, (base if base is not self.P else None)
 
 
 